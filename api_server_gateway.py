@@ -1,23 +1,88 @@
-import boto3
-import json
+import aioboto3
+import aiohttp
+import redis.asyncio as redis
+import os
+import orjson
+import hashlib
 import time
 import asyncio
-import threading
-from typing import List, Dict, Any
+from contextlib import asynccontextmanager
+from typing import List, Optional
+from botocore.config import Config
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, validator
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, ValidationError, validator
 import logging
-from config.settings import get_settings
+from config.settings import get_settings, setup_logging, teardown_logging
 
 # Get application settings
 settings = get_settings()
 
-# Configure logging
-logging.basicConfig(level=getattr(logging, settings.log_level))
+# Hot-path settings read once at import instead of on every invocation
+LAMBDA_FUNCTION_NAME = settings.lambda_function_name
+LAMBDA_BATCH_SIZE = settings.lambda_batch_size
+MAX_CONCURRENT_REQUESTS = settings.max_concurrent_requests
+CACHE_TTL_SECONDS = settings.cache_ttl_seconds
+NORMALIZE_URL = f"{settings.api_gateway_url}/normalize" if settings.api_gateway_url else None
+
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Text Normalization API Gateway", version="1.0.0")
+# AWS session used to open the shared async Lambda client
+session = aioboto3.Session()
+
+# Size the connection pool for concurrent fan-out and keep connections alive
+lambda_config = Config(
+    max_pool_connections=settings.max_concurrent_requests * 4,
+    tcp_keepalive=True,
+    retries={'max_attempts': 3, 'mode': 'adaptive'},
+    connect_timeout=5,
+    read_timeout=settings.request_timeout
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Share one async Lambda client per worker and close it on shutdown"""
+    # Attach the queue handler only while its listener runs, so records are never queued unconsumed
+    log_listener = setup_logging(settings)
+    log_listener.start()
+    async with session.client('lambda', region_name=settings.aws_region, config=lambda_config) as client:
+        app.state.lambda_client = client
+        
+        # Response cache is optional and only enabled when Redis is configured; short timeouts
+        # turn an unreachable host into a cache miss instead of a hung request
+        if settings.redis_url:
+            app.state.redis = redis.Redis.from_url(
+                settings.redis_url,
+                socket_timeout=settings.redis_timeout,
+                socket_connect_timeout=settings.redis_timeout
+            )
+        
+        # Call the Lambda through API Gateway over HTTP when a URL is configured
+        if settings.api_gateway_url:
+            app.state.http_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=settings.max_concurrent_requests * 4,
+                    keepalive_timeout=75
+                ),
+                timeout=aiohttp.ClientTimeout(total=settings.request_timeout)
+            )
+        try:
+            yield
+        finally:
+            if app.state.redis is not None:
+                await app.state.redis.aclose()
+            if app.state.http_session is not None:
+                await app.state.http_session.close()
+            teardown_logging(log_listener)
+
+# Responses are small JSON bodies, serialized with orjson and left uncompressed
+app = FastAPI(
+    title="Text Normalization API Gateway",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
 
 # Add CORS middleware with proper configuration
 app.add_middleware(
@@ -28,8 +93,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize AWS Lambda client
-lambda_client = boto3.client('lambda', region_name=settings.aws_region)
+# No response cache or HTTP session until the lifespan opens them
+app.state.redis = None
+app.state.http_session = None
+
+# Lambda invocations in progress, keyed by cache key, shared by duplicate requests
+app.state.in_flight = {}
+
+# Admission control for concurrent batch requests across all clients
+batch_limiter = asyncio.Semaphore(settings.max_concurrent_batches)
+
+# Cap on batch Lambda invocations in flight across all concurrent batches, to stay under Lambda concurrency limits
+invoke_limiter = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
 
 class CommentRequest(BaseModel):
     comment_id: int
@@ -55,6 +130,8 @@ class CommentRequest(BaseModel):
         return v
 
 class CommentResponse(BaseModel):
+    model_config = ConfigDict(frozen=True, extra='ignore')
+    
     comment_id: int
     original_text: str
     normalized_text: str
@@ -75,7 +152,7 @@ class BatchRequest(BaseModel):
 class BatchResponse(BaseModel):
     results: List[CommentResponse]
 
-def invoke_lambda_function(comment: CommentRequest) -> Dict[str, Any]:
+async def invoke_lambda_function(comment: CommentRequest) -> CommentResponse:
     """Invoke Lambda function for a single comment"""
     logger.info(f"Invoking Lambda for comment {comment.comment_id}")
     
@@ -90,37 +167,92 @@ def invoke_lambda_function(comment: CommentRequest) -> Dict[str, Any]:
             'text': comment.text
         }
         
-        # Invoke Lambda function with timeout
-        response = lambda_client.invoke(
-            FunctionName=settings.lambda_function_name,
-            InvocationType='RequestResponse',
-            Payload=json.dumps(payload)
-        )
-        
-        # Parse response
-        response_payload = json.loads(response['Payload'].read())
+        if app.state.http_session is not None:
+            # POST straight to API Gateway, avoiding botocore request handling
+            async with app.state.http_session.post(NORMALIZE_URL, json=payload) as http_response:
+                status_code = http_response.status
+                response_payload = orjson.loads(await http_response.read())
+        else:
+            # Invoke Lambda function with timeout
+            response = await app.state.lambda_client.invoke(
+                FunctionName=LAMBDA_FUNCTION_NAME,
+                InvocationType='RequestResponse',
+                Payload=orjson.dumps(payload)
+            )
+            
+            # Parse response
+            status_code = response['StatusCode']
+            response_payload = orjson.loads(await response['Payload'].read())
         
-        if response['StatusCode'] == 200:
+        if status_code == 200:
             # Check if response is in API Gateway format
             if 'body' in response_payload:
-                # Parse the body from API Gateway response
-                body_content = json.loads(response_payload['body'])
-                logger.info(f"Lambda completed successfully for comment {comment.comment_id}")
-                return body_content
+                # Parse the body from API Gateway response straight into the model
+                result = CommentResponse.model_validate_json(response_payload['body'])
             else:
                 # Direct Lambda response
-                logger.info(f"Lambda completed successfully for comment {comment.comment_id}")
-                return response_payload
+                result = CommentResponse.model_validate(response_payload)
+            logger.info(f"Lambda completed successfully for comment {comment.comment_id}")
+            return result
         else:
-            error_msg = f"Lambda invocation failed with status {response['StatusCode']}: {response_payload}"
+            error_msg = f"Lambda invocation failed with status {status_code}: {response_payload}"
             logger.error(error_msg)
             raise Exception(error_msg)
             
+    except ValidationError as e:
+        error_msg = f"Invalid Lambda response: {str(e)}"
+        logger.error(error_msg)
+        raise HTTPException(status_code=500, detail=error_msg)
+    # JSONDecodeError subclasses ValueError, so it must be caught first
+    except orjson.JSONDecodeError as e:
+        error_msg = f"JSON parsing error: {str(e)}"
+        logger.error(error_msg)
+        raise HTTPException(status_code=500, detail=error_msg)
     except ValueError as e:
         error_msg = f"Validation error: {str(e)}"
         logger.error(error_msg)
         raise HTTPException(status_code=400, detail=error_msg)
-    except json.JSONDecodeError as e:
+    except Exception as e:
+        error_msg = f"Lambda invocation error: {str(e)}"
+        logger.error(error_msg)
+        raise HTTPException(status_code=500, detail=error_msg)
+
+async def invoke_lambda_batch(comments: List[CommentRequest]) -> List[CommentResponse]:
+    """Invoke Lambda function once for a chunk of comments"""
+    logger.info(f"Invoking Lambda for {len(comments)} comments")
+    
+    try:
+        # Prepare payload for Lambda
+        payload = {
+            'comments': [
+                {'comment_id': comment.comment_id, 'text': comment.text}
+                for comment in comments
+            ]
+        }
+        
+        response = await app.state.lambda_client.invoke(
+            FunctionName=LAMBDA_FUNCTION_NAME,
+            InvocationType='RequestResponse',
+            Payload=orjson.dumps(payload)
+        )
+        
+        # Parse response
+        response_payload = orjson.loads(await response['Payload'].read())
+        
+        if response['StatusCode'] != 200:
+            raise Exception(f"Lambda invocation failed with status {response['StatusCode']}: {response_payload}")
+        
+        # Check if response is in API Gateway format
+        if 'body' in response_payload:
+            response_payload = orjson.loads(response_payload['body'])
+        
+        if 'results' not in response_payload:
+            raise Exception(f"Lambda batch failed: {response_payload.get('error', response_payload)}")
+        
+        logger.info(f"Lambda completed successfully for {len(comments)} comments")
+        return BatchResponse.model_validate(response_payload).results
+        
+    except orjson.JSONDecodeError as e:
         error_msg = f"JSON parsing error: {str(e)}"
         logger.error(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
@@ -129,21 +261,32 @@ def invoke_lambda_function(comment: CommentRequest) -> Dict[str, Any]:
         logger.error(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
 
-def invoke_lambda_concurrent(comment: CommentRequest, results: List[Dict], index: int):
-    """Invoke Lambda function concurrently and store result"""
+def get_cache_key(text: str) -> str:
+    """Build a content-addressable cache key from the comment text"""
+    return "norm:" + hashlib.sha256(text.encode()).hexdigest()[:32]
+
+async def get_cached_result(key: str) -> Optional[CommentResponse]:
+    """Look up a cached Lambda result, treating cache errors as a miss"""
     try:
-        result = invoke_lambda_function(comment)
-        results[index] = result
-        logger.info(f"✅ Lambda completed for comment {comment.comment_id}")
-    except Exception as e:
-        logger.error(f"❌ Lambda failed for comment {comment.comment_id}: {str(e)}")
-        results[index] = {
-            'comment_id': comment.comment_id,
-            'original_text': comment.text,
-            'normalized_text': f"Error: {str(e)}",
-            'processing_time': 0,
-            'lambda_instance_id': 'error'
-        }
+        cached = await app.state.redis.get(key)
+    except redis.RedisError as e:
+        logger.warning(f"Cache lookup failed: {str(e)}")
+        return None
+    return CommentResponse.model_validate_json(cached) if cached else None
+
+async def cache_result(key: str, result: CommentResponse):
+    """Store a Lambda result in the cache with the configured TTL"""
+    try:
+        await app.state.redis.set(key, result.model_dump_json(), ex=CACHE_TTL_SECONDS)
+    except redis.RedisError as e:
+        logger.warning(f"Cache write failed: {str(e)}")
+
+async def invoke_and_cache(comment: CommentRequest, cache_key: str) -> CommentResponse:
+    """Invoke Lambda for a comment and cache the result"""
+    result = await invoke_lambda_function(comment)
+    if app.state.redis is not None:
+        await cache_result(cache_key, result)
+    return result
 
 @app.get("/health")
 async def health_check():
@@ -156,28 +299,29 @@ async def normalize_comment(comment: CommentRequest):
     try:
         start_time = time.time()
         
-        # Invoke Lambda function
-        print("before invoking Lambda function", comment.comment_id)
-        result = invoke_lambda_function(comment)
-        print("after invoking Lambda function", result)
+        # Serve identical text from the cache before invoking Lambda
+        cache_key = get_cache_key(comment.text)
+        result = None
+        if app.state.redis is not None:
+            result = await get_cached_result(cache_key)
+        
+        if result is None:
+            # Share one Lambda invocation between concurrent requests for the same text
+            task = app.state.in_flight.get(cache_key)
+            if task is None:
+                task = asyncio.create_task(invoke_and_cache(comment, cache_key))
+                app.state.in_flight[cache_key] = task
+                task.add_done_callback(lambda _: app.state.in_flight.pop(cache_key, None))
+            
+            result = await asyncio.shield(task)
         
         processing_time = time.time() - start_time
-
-        print("result", CommentResponse(
-            comment_id=result['comment_id'],
-            original_text=result['original_text'],
-            normalized_text=result['normalized_text'],
-            processing_time=processing_time,
-            lambda_instance_id=result['lambda_instance_id']
-        ))
-        
-        return CommentResponse(
-            comment_id=result['comment_id'],
-            original_text=result['original_text'],
-            normalized_text=result['normalized_text'],
-            processing_time=processing_time,
-            lambda_instance_id=result['lambda_instance_id']
-        )
+        
+        # Result is already validated, so copy it without re-validating
+        return result.model_copy(update={
+            'comment_id': comment.comment_id,
+            'processing_time': processing_time
+        })
         
     except HTTPException:
         raise
@@ -185,51 +329,85 @@ async def normalize_comment(comment: CommentRequest):
         logger.error(f"Unexpected error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-@app.post("/normalize-batch", response_model=BatchResponse)
-async def normalize_batch_comments(batch_request: BatchRequest):
-    """Normalize multiple comments concurrently using Lambda functions"""
+async def process_batch(batch_request: BatchRequest) -> BatchResponse:
+    """Invoke Lambda for every comment in a batch and collect the results"""
     try:
         start_time = time.time()
         
-        # Initialize results list
-        results = [None] * len(batch_request.comments)
-        threads = []
+        comments = batch_request.comments
+        
+        async def invoke_bounded(invoke, *args):
+            async with invoke_limiter:
+                return await invoke(*args)
         
-        # Create threads for concurrent Lambda invocations
-        for i, comment in enumerate(batch_request.comments):
-            thread = threading.Thread(
-                target=invoke_lambda_concurrent,
-                args=(comment, results, i)
+        if LAMBDA_BATCH_SIZE > 1:
+            # Send comments to Lambda in chunks, one invocation per chunk
+            chunks = [
+                comments[i:i + LAMBDA_BATCH_SIZE]
+                for i in range(0, len(comments), LAMBDA_BATCH_SIZE)
+            ]
+            chunk_results = await asyncio.gather(
+                *(invoke_bounded(invoke_lambda_batch, chunk) for chunk in chunks),
+                return_exceptions=True
+            )
+            
+            # Flatten back to one result per comment, matched by comment_id so a short response can't misalign results
+            results = []
+            for chunk, chunk_result in zip(chunks, chunk_results):
+                if isinstance(chunk_result, BaseException):
+                    results.extend([chunk_result] * len(chunk))
+                    continue
+                
+                results_by_id = {}
+                for result in chunk_result:
+                    results_by_id.setdefault(result.comment_id, []).append(result)
+                for comment in chunk:
+                    matches = results_by_id.get(comment.comment_id)
+                    results.append(
+                        matches.pop(0) if matches
+                        else Exception(f"Lambda returned no result for comment {comment.comment_id}")
+                    )
+        else:
+            # Invoke Lambda for every comment concurrently on the event loop
+            results = await asyncio.gather(
+                *(invoke_bounded(invoke_lambda_function, comment) for comment in comments),
+                return_exceptions=True
             )
-            threads.append(thread)
-            thread.start()
         
-        # Wait for all threads to complete
-        for thread in threads:
-            thread.join()
+        # Map failed invocations to error results
+        for i, (comment, result) in enumerate(zip(comments, results)):
+            if isinstance(result, BaseException):
+                logger.error(f"❌ Lambda failed for comment {comment.comment_id}: {str(result)}")
+                results[i] = CommentResponse.model_construct(
+                    comment_id=comment.comment_id,
+                    original_text=comment.text,
+                    normalized_text=f"Error: {str(result)}",
+                    processing_time=0,
+                    lambda_instance_id='error'
+                )
         
         total_time = time.time() - start_time
         
-        # Convert results to CommentResponse objects
-        response_results = []
-        for result in results:
-            if result:
-                response_results.append(CommentResponse(
-                    comment_id=result['comment_id'],
-                    original_text=result['original_text'],
-                    normalized_text=result['normalized_text'],
-                    processing_time=result['processing_time'],
-                    lambda_instance_id=result['lambda_instance_id']
-                ))
-        
         logger.info(f"✅ Batch processing completed in {total_time:.2f}s")
         
-        return BatchResponse(results=response_results)
+        # Every result is already a CommentResponse, so skip re-validating the list
+        return BatchResponse.model_construct(results=results)
         
     except Exception as e:
         logger.error(f"Batch processing error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Batch processing error: {str(e)}")
 
+@app.post("/normalize-batch", response_model=BatchResponse)
+async def normalize_batch_comments(batch_request: BatchRequest):
+    """Normalize multiple comments concurrently using Lambda functions"""
+    # Reject new batches instead of queueing them when the gateway is saturated
+    if batch_limiter.locked():
+        logger.warning("Rejecting batch request: too many batches in progress")
+        raise HTTPException(status_code=503, detail="Server busy, please retry later")
+    
+    async with batch_limiter:
+        return await process_batch(batch_request)
+
 @app.get("/")
 async def root():
     return {
@@ -244,4 +422,11 @@ async def root():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    uvicorn.run(
+        "api_server_gateway:app",
+        host=settings.api_host,
+        port=settings.api_port,
+        loop="uvloop",
+        http="httptools",
+        workers=os.cpu_count()
+    )
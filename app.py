@@ -1,21 +1,14 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 import os 
-import json
-import time
-import pandas as pd
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import threading
-import re
 from typing import List, Dict, Any
 import logging
-from config.settings import get_settings
+from config.settings import get_settings, setup_logging
 
 # Get application settings
 settings = get_settings()
 
-# Configure logging
-logging.basicConfig(level=getattr(logging, settings.log_level))
 logger = logging.getLogger(__name__)
 
 # Configure page
@@ -27,39 +20,55 @@ st.set_page_config(
 )
 
 
-# Helper function to normalize comments in parallel
-def normalize_comments_batch(comments: List[str], api_endpoint: str) -> List[Dict[str, Any]]:
-    results = []
-    with ThreadPoolExecutor(max_workers=len(comments)) as executor:
-        future_to_comment = {
-            executor.submit(normalize_comment, comment, api_endpoint, idx+1): comment
-            for idx, comment in enumerate(comments)
-        }
+# Configure logging once per server process, not on every rerun
+@st.cache_resource(show_spinner=False)
+def start_logging():
+    listener = setup_logging(settings)
+    listener.start()
+    return listener
 
-        for future in as_completed(future_to_comment):
-            results.append(future.result())
-    return results 
 
+start_logging()
 
-def normalize_comment(comment, api_endpoint, comment_id):
-    payload = {
-        "comment_id": comment_id,
-        "text": comment.strip()
-    }
-    try:
-        response = requests.post(
-            f"{api_endpoint}/normalize",
-            json=payload,
-            timeout=30
-        )
-        if response.status_code == 200:
-            result = response.json()
-            result['original_text'] = comment
-            return result
-        else:
-            return {'error': response.text, 'original_text': comment}
-    except Exception as e:
-        return {'error': str(e), 'original_text': comment}
+
+# Maximum comments accepted by the /normalize-batch endpoint
+BATCH_LIMIT = 100
+
+
+# Shared HTTP session, cached across Streamlit reruns so connections are reused
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=50, pool_maxsize=50)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Helper function to normalize comments with the batch endpoint
+def normalize_comments_batch(comments: List[str], api_endpoint: str) -> List[Dict[str, Any]]:
+    results = []
+    for start in range(0, len(comments), BATCH_LIMIT):
+        chunk = comments[start:start + BATCH_LIMIT]
+        payload = {
+            "comments": [
+                {"comment_id": start + idx + 1, "text": comment.strip()}
+                for idx, comment in enumerate(chunk)
+            ]
+        }
+        try:
+            response = get_http_session().post(
+                f"{api_endpoint}/normalize-batch",
+                json=payload,
+                timeout=60
+            )
+            if response.status_code == 200:
+                results.extend(response.json()["results"])
+            else:
+                results.extend({'error': response.text, 'original_text': comment} for comment in chunk)
+        except Exception as e:
+            results.extend({'error': str(e), 'original_text': comment} for comment in chunk)
+    return results
 
 # Custom CSS for better styling
 st.markdown("""
@@ -169,7 +178,7 @@ with col2:
     if st.button("🔄 Normalize All Comments", type="primary", use_container_width=True):
         comments = [line.strip() for line in user_text.split('\n') if line.strip()]
         if comments:
-            with st.spinner("Processing all comments in parallel..."):
+            with st.spinner("Processing all comments..."):
                 results = normalize_comments_batch(comments, api_endpoint)
                 st.session_state.results = results
                 st.session_state.total_processed = len(results)
@@ -189,7 +198,7 @@ with col2:
                     }
                     
                     # Make API call
-                    response = requests.post(
+                    response = get_http_session().post(
                         f"{api_endpoint}/normalize",
                         json=payload,
                         timeout=30
@@ -2,6 +2,10 @@
 Configuration management for the text normalization application
 """
 import os
+import queue
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from functools import lru_cache
 from typing import Optional
 from pydantic import Field
 from pydantic_settings import BaseSettings
@@ -18,20 +22,39 @@ class Settings(BaseSettings):
     api_host: str = Field(default="0.0.0.0", env="API_HOST")
     api_port: int = Field(default=8000, env="API_PORT")
     api_endpoint: str = Field(default="http://localhost:8000", env="API_ENDPOINT")
+    api_gateway_url: Optional[str] = Field(default=None, env="API_GATEWAY_URL")
     
     # Lambda Configuration
     lambda_timeout: int = Field(default=30, env="LAMBDA_TIMEOUT")
     lambda_memory_size: int = Field(default=256, env="LAMBDA_MEMORY_SIZE")
+    lambda_batch_size: int = Field(default=1, env="LAMBDA_BATCH_SIZE")  # Comments per invocation in batch requests
     
     # Bedrock Configuration
     bedrock_model_id: str = Field(default="amazon.nova-lite-v1:0", env="BEDROCK_MODEL_ID")
-    bedrock_temperature: float = Field(default=0.7, env="BEDROCK_TEMPERATURE")
-    bedrock_top_p: float = Field(default=0.9, env="BEDROCK_TOP_P")
+    bedrock_temperature: float = Field(default=0.0, env="BEDROCK_TEMPERATURE")  # Greedy decoding for deterministic rewrites
+    bedrock_top_p: float = Field(default=1.0, env="BEDROCK_TOP_P")
+    bedrock_max_output_tokens: int = Field(default=5000, env="BEDROCK_MAX_OUTPUT_TOKENS")  # Model's output limit (Nova Lite: 5,000)
+    bedrock_streaming: bool = Field(default=False, env="BEDROCK_STREAMING")  # Read the response as a token stream
+    bedrock_performance_latency: Optional[str] = Field(default=None, env="BEDROCK_PERFORMANCE_LATENCY")  # "optimized" where the model supports it
+    warm_bedrock: bool = Field(default=False, env="WARM_BEDROCK")  # Open the Bedrock connection during Lambda init
     
     # Application Configuration
-    max_concurrent_requests: int = Field(default=10, env="MAX_CONCURRENT_REQUESTS")
+    max_concurrent_requests: int = Field(default=50, env="MAX_CONCURRENT_REQUESTS")
+    max_concurrent_batches: int = Field(default=10, env="MAX_CONCURRENT_BATCHES")
     request_timeout: int = Field(default=30, env="REQUEST_TIMEOUT")
     
+    # Cache Configuration
+    redis_url: Optional[str] = Field(default=None, env="REDIS_URL")
+    cache_ttl_seconds: int = Field(default=3600, env="CACHE_TTL_SECONDS")
+    redis_timeout: float = Field(default=0.25, env="REDIS_TIMEOUT")  # Seconds before an unresponsive cache counts as a miss
+    normalization_cache_size: int = Field(default=1024, env="NORMALIZATION_CACHE_SIZE")  # Per-container LRU entries
+    dynamodb_cache_table: Optional[str] = Field(default=None, env="DYNAMODB_CACHE_TABLE")  # Shared across Lambda instances
+    
+    # Bedrock Batch Inference Configuration
+    batch_inference_bucket: Optional[str] = Field(default=None, env="BATCH_INFERENCE_BUCKET")  # Enables mode="batch" requests
+    batch_inference_role_arn: Optional[str] = Field(default=None, env="BATCH_INFERENCE_ROLE_ARN")  # Role Bedrock assumes to access the bucket
+    batch_inference_min_records: int = Field(default=100, env="BATCH_INFERENCE_MIN_RECORDS")  # Bedrock's minimum records per job
+    
     # Logging Configuration
     log_level: str = Field(default="INFO", env="LOG_LEVEL")
     log_format: str = Field(default="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
@@ -49,11 +72,36 @@ class Settings(BaseSettings):
 settings = Settings()
 
 
+@lru_cache(maxsize=1)
 def get_settings() -> Settings:
     """Get application settings"""
     return settings
 
 
+def setup_logging(settings: Settings) -> QueueListener:
+    """Route log records through a queue so formatting and I/O run on a background thread"""
+    log_queue = queue.Queue(-1)
+    
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(settings.log_format))
+    
+    root_logger = logging.getLogger()
+    root_logger.setLevel(getattr(logging, settings.log_level))
+    root_logger.addHandler(QueueHandler(log_queue))
+    
+    # Caller starts and stops the listener with the application lifecycle
+    return QueueListener(log_queue, handler, respect_handler_level=True)
+
+
+def teardown_logging(listener: QueueListener) -> None:
+    """Detach the QueueHandler feeding a listener, then stop it once the queue is drained"""
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        if isinstance(handler, QueueHandler) and handler.queue is listener.queue:
+            root_logger.removeHandler(handler)
+    listener.stop()
+
+
 def validate_aws_credentials() -> bool:
     """Validate AWS credentials are configured"""
     required_vars = ["AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"]
@@ -71,7 +119,7 @@ def get_lambda_arn() -> str:
 
 def get_api_gateway_url() -> Optional[str]:
     """Get API Gateway URL if configured"""
-    return os.getenv("API_GATEWAY_URL")
+    return settings.api_gateway_url
 
 
 # Environment-specific configurations
@@ -88,6 +136,7 @@ class ProductionSettings(Settings):
     cors_origins: list = Field(default_factory=list)  # Must be explicitly set
 
 
+@lru_cache(maxsize=1)
 def get_environment_settings() -> Settings:
     """Get environment-specific settings"""
     env = os.getenv("ENVIRONMENT", "development").lower()
@@ -1,12 +1,26 @@
-import json
+from __future__ import annotations
+
+import orjson
 import boto3
 import time
+import hashlib
 import logging
 import re
-from typing import Dict, Any, List
-from botocore.exceptions import ClientError
+import uuid
+from urllib.parse import unquote_plus
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple, Union
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
 from config.settings import get_settings
 
+# RE2 (google-re2) matches in linear time in C; fall back to the stdlib engine when it isn't installed
+try:
+    import re2
+except ImportError:
+    re2 = None
+
 # Get application settings
 settings = get_settings()
 
@@ -14,8 +28,72 @@ settings = get_settings()
 logger = logging.getLogger()
 logger.setLevel(getattr(logging, settings.log_level))
 
-# Initialize AWS clients
-bedrock_runtime = boto3.client('bedrock-runtime', region_name=settings.aws_region)
+# Initialize AWS clients once per container so warm invocations reuse connections
+bedrock_runtime = boto3.client(
+    'bedrock-runtime',
+    region_name=settings.aws_region,
+    config=Config(
+        retries={'max_attempts': 3, 'mode': 'adaptive'},
+        tcp_keepalive=True,
+        max_pool_connections=50,
+        connect_timeout=1,
+        read_timeout=settings.request_timeout
+    )
+)
+
+# Integer part with optional thousands separators: 2500, 2,500 (a trailing list comma is not captured)
+DIGITS = r'(?:\d{1,3}(?:,\d{3})+|\d+)'
+
+# Number patterns to preserve (order matters - most specific first)
+NUMBER_PATTERNS = [
+    rf'\${DIGITS}\.?\d*\s*~\s*\${DIGITS}\.?\d*',  # Currency ranges: $500 ~ $750
+    rf'{DIGITS}\.?\d*\s*~\s*{DIGITS}\.?\d*',      # Number ranges: 7.5 ~ 8
+    rf'{DIGITS}\.?\d*%',                          # Percentages: 15%, 7.5%
+    rf'\${DIGITS}\.?\d*',                         # Currency: $2500, $2,500.75
+    rf'\b{DIGITS}\.?\d*\b',                       # Regular numbers: 3.2, 48 (with word boundaries)
+]
+
+# Single alternation compiled once per cold start; the leftmost alternative wins at each
+# position, so more specific patterns take precedence without an overlap check
+NUMBER_REGEX = '|'.join(f'(?:{pattern})' for pattern in NUMBER_PATTERNS)
+NUMBER_PATTERN = (re2 or re).compile(NUMBER_REGEX)
+
+# Placeholder inserted in place of each preserved number
+PLACEHOLDER_PATTERN = re.compile(r'__NUMBER_\d+__')
+
+# Any letter; text without one is only numbers and punctuation, which the LLM has nothing to fix
+LETTER_PATTERN = re.compile(r'[^\W\d_]')
+
+# Instructions sent once as Nova's system prompt rather than repeated in each user message
+SYSTEM_PROMPT = (
+    "You rewrite comments for an insurance underwriter so they are grammatically correct and "
+    "professional while keeping the meaning exactly the same. Copy every __NUMBER_n__ placeholder "
+    "exactly as written. Reply with the normalized text only."
+)
+
+# Static parts of the user prompts, built once at import so each call only concatenates the text
+PROMPT_PREFIX = 'Normalize this text for professional insurance underwriting documentation: "'
+PROMPT_SUFFIX = '"'
+BATCH_PROMPT_PREFIX = (
+    'Normalize each input independently for professional insurance underwriting documentation. '
+    'Reply with one line per input in the form "Output N: <normalized text>".\n\n'
+)
+
+# "Output N:" markers separating texts in a batched LLM response
+BATCH_OUTPUT_PATTERN = re.compile(r'^\s*Output (\d+):\s*', re.MULTILINE)
+
+def estimate_max_tokens(text: str) -> int:
+    """Bound output tokens to roughly 1.5x the input, since normalization rarely lengthens text"""
+    return min(settings.bedrock_max_output_tokens, max(64, int(1.5 * (len(text) // 4))))
+
+class BedrockError(Exception):
+    """Raised when text normalization through Bedrock fails"""
+
+class InvalidRequestError(ValueError):
+    """Raised when a request cannot be processed as sent; reported to the caller as a 400"""
+
+class OutputTruncatedError(ValueError):
+    """Raised when Bedrock stops generating because it reached maxTokens"""
 
 class BedrockTextNormalizer:
     """Text normalizer using AWS Bedrock Nova LLM"""
@@ -24,93 +102,146 @@ class BedrockTextNormalizer:
         # Nova model ID - using the correct Nova Lite model ID
         self.model_id = settings.bedrock_model_id
         
+        # Latency-optimized inference is only requested when configured, since not every model supports it
+        self.invoke_options = {}
+        if settings.bedrock_performance_latency:
+            self.invoke_options['performanceConfigLatency'] = settings.bedrock_performance_latency
+        
     def create_prompt(self, text: str) -> str:
         """Create a prompt for the LLM to normalize text while preserving numbers"""
-        prompt = f"""
-Please normalize the following text for an insurance underwriter. 
-The text should be grammatically correct and professional while preserving all numbers, percentages, and currency values exactly as they appear.
-
-Rules:
-1. Preserve all numbers, percentages (like 80.5%), currency amounts (like $500), and ranges (like 7.5 ~ 8)
-2. Fix grammar and make the text more professional
-3. Keep the meaning exactly the same
-4. Make it suitable for insurance underwriting documentation
-
-Text to normalize: "{text}"
-
-Normalized text:"""
-        return prompt.strip()
+        return PROMPT_PREFIX + text + PROMPT_SUFFIX
+    
+    def create_batch_prompt(self, texts: List[str]) -> str:
+        """Create a single prompt asking the LLM to normalize several texts"""
+        inputs = "\n".join(f'Input {i}: "{text}"' for i, text in enumerate(texts, 1))
+        return BATCH_PROMPT_PREFIX + inputs
+    
+    def parse_batch_output(self, output: str, count: int) -> Optional[List[str]]:
+        """Split a batched LLM response into one text per input, or None if it is incomplete"""
+        parts = BATCH_OUTPUT_PATTERN.split(output)
+        outputs = {int(index): text.strip() for index, text in zip(parts[1::2], parts[2::2])}
+        if sorted(outputs) != list(range(1, count + 1)) or not all(outputs.values()):
+            return None
+        return [outputs[i] for i in range(1, count + 1)]
     
     def extract_numbers_before_llm(self, text: str) -> dict:
         """Extract and preserve numbers before sending to LLM"""
-        # Define number patterns to preserve (order matters - most specific first)
-        number_patterns = [
-            r'\$\d+\.?\d*\s*~\s*\$\d+\.?\d*',  # Currency ranges: $500 ~ $750
-            r'\d+\.?\d*\s*~\s*\d+\.?\d*',      # Number ranges: 7.5 ~ 8
-            r'\d+\.?\d*%',                      # Percentages: 15%, 7.5%
-            r'\$\d+\.?\d*',                     # Currency: $2500
-            r'\b\d+\.?\d*\b',                   # Regular numbers: 3.2, 48 (with word boundaries)
-        ]
-        
         placeholder_map = {}  # placeholder -> original_number
-        modified_text = text
-        processed_positions = set()
+        seen_numbers = set()  # original numbers already in placeholder_map
         
-        print(f"Original text: '{text}'")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Original text: '{text}'")
         
-        # Process patterns from most specific to least specific
-        for i, pattern in enumerate(number_patterns):
-            matches = list(re.finditer(pattern, modified_text))
-
-            
-            # Process matches in reverse order to maintain positions
-            for match in reversed(matches):
-                print(f"Match: {match}")
-                start, end = match.span()
-                number_str = match.group()
-
-                
-                # Check if this position overlaps with already processed positions
-                overlap = False
-                for pos_start, pos_end in processed_positions:
-                    if not (end <= pos_start or start >= pos_end):
-                        overlap = True
-                        print(f"Overlap detected with position {pos_start}-{pos_end}")
-                        break
-                
-                if not overlap and number_str not in placeholder_map.values():
-                    placeholder = f"__NUMBER_{len(placeholder_map)}__"
-                    placeholder_map[placeholder] = number_str
-                    processed_positions.add((start, end))
-                    
-                    
-                    # Replace the number with placeholder
-                    modified_text = modified_text[:start] + placeholder + modified_text[end:]
-                else:
-                    print(f"Skipping '{number_str}' (overlap or duplicate)")
+        def replace_number(match: re.Match) -> str:
+            number_str = match.group()
+            if number_str in seen_numbers:
+                # Duplicate numbers are left as-is
+                return number_str
+            placeholder = f"__NUMBER_{len(placeholder_map)}__"
+            placeholder_map[placeholder] = number_str
+            seen_numbers.add(number_str)
+            return placeholder
         
+        # Replace every number with a placeholder in a single pass
+        modified_text = NUMBER_PATTERN.sub(replace_number, text)
         
         return modified_text, placeholder_map
     
     def restore_numbers_after_llm(self, text: str, placeholder_map: dict) -> str:
         """Restore preserved numbers after LLM processing using placeholder map"""
-        result = text
-        
-        # Find all NUMBER patterns in the text
-        import re
-        number_pattern = re.compile(r'__NUMBER_\d+__')
-        matches = number_pattern.findall(result)
-        
-        # Replace each placeholder with its original number from the map
-        for placeholder in matches:
-            if placeholder in placeholder_map:
-                original_number = placeholder_map[placeholder]
-                logger.info(f"Replacing '{placeholder}' with '{original_number}'")
-                result = result.replace(placeholder, original_number)
-            else:
+        def restore_number(match):
+            placeholder = match.group(0)
+            if placeholder not in placeholder_map:
                 logger.warning(f"Placeholder '{placeholder}' not found in map")
+                return placeholder
+            
+            original_number = placeholder_map[placeholder]
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Replacing '{placeholder}' with '{original_number}'")
+            return original_number
+        
+        # Replace every placeholder with its original number in a single pass
+        return PLACEHOLDER_PATTERN.sub(restore_number, text)
+    
+    def create_request_body(self, prompt: str, max_tokens: int) -> Dict[str, Any]:
+        """Build the Nova request body for a prompt"""
+        return {
+            "system": [
+                {
+                    "text": SYSTEM_PROMPT
+                }
+            ],
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "text": prompt
+                        }
+                    ]
+                }
+            ],
+            "inferenceConfig": {
+                "maxTokens": max_tokens,
+                "temperature": settings.bedrock_temperature,
+                "top_p": settings.bedrock_top_p
+            }
+        }
+    
+    def invoke_bedrock(self, prompt: str, max_tokens: int) -> str:
+        """Send a prompt to Bedrock Nova LLM and return the generated text"""
+        request_body = self.create_request_body(prompt, max_tokens)
+        
+        logger.info("Invoking Bedrock Nova LLM")
+        if settings.bedrock_streaming:
+            output_text, stop_reason = self.invoke_bedrock_stream(request_body)
+        else:
+            response = bedrock_runtime.invoke_model(
+                modelId=self.model_id,
+                contentType="application/json",
+                accept="application/json",
+                body=orjson.dumps(request_body),
+                **self.invoke_options
+            )
+            
+            # Parse response
+            response_body = orjson.loads(response['body'].read())
+            output_text = response_body.get('output', {}).get('message', {}).get('content', [{}])[0].get('text', '').strip()
+            stop_reason = response_body.get('stopReason')
+        
+        # A cut-off response would silently drop the end of the comment
+        if stop_reason == 'max_tokens':
+            raise OutputTruncatedError(f"Bedrock output reached the {max_tokens} token limit")
+        
+        if not output_text:
+            raise ValueError("Empty response from Bedrock API")
+        
+        return output_text
+    
+    def invoke_bedrock_stream(self, request_body: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+        """Stream a Bedrock Nova LLM response and join its text deltas as they arrive"""
+        response = bedrock_runtime.invoke_model_with_response_stream(
+            modelId=self.model_id,
+            contentType="application/json",
+            accept="application/json",
+            body=orjson.dumps(request_body),
+            **self.invoke_options
+        )
+        
+        chunks = []
+        stop_reason = None
+        for event in response['body']:
+            chunk = event.get('chunk')
+            if not chunk:
+                continue
+            payload = orjson.loads(chunk['bytes'])
+            delta = payload.get('contentBlockDelta', {}).get('delta', {})
+            if 'text' in delta:
+                chunks.append(delta['text'])
+            if 'messageStop' in payload:
+                stop_reason = payload['messageStop'].get('stopReason')
         
-        return result
+        return ''.join(chunks).strip(), stop_reason
     
     def normalize_with_bedrock(self, text: str) -> str:
         """Normalize text using Bedrock Nova LLM"""
@@ -119,6 +250,10 @@ Normalized text:"""
             if not text or not text.strip():
                 raise ValueError("Text cannot be empty")
             
+            if not LETTER_PATTERN.search(text):
+                logger.info("Text has no words to normalize, skipping Bedrock call")
+                return text
+            
             # Step 1: Extract and preserve numbers
             text_with_placeholders, placeholder_map = self.extract_numbers_before_llm(text)
             
@@ -126,102 +261,321 @@ Normalized text:"""
             prompt = self.create_prompt(text_with_placeholders)
             logger.info(f"Processing text with length: {len(text)}")
             
-            # Step 3: Call Bedrock Nova LLM
-            request_body = {
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "text": prompt
-                            }
-                        ]
-                    }
-                ],
-                "inferenceConfig": {
-                    "temperature": settings.bedrock_temperature,
-                    "top_p": settings.bedrock_top_p
-                }
-            }
+            # Step 3: Call Bedrock Nova LLM, retrying with the model's full output budget if the estimate was too small
+            max_tokens = estimate_max_tokens(text_with_placeholders)
+            try:
+                normalized_text = self.invoke_bedrock(prompt, max_tokens)
+            except OutputTruncatedError:
+                if max_tokens >= settings.bedrock_max_output_tokens:
+                    raise
+                logger.warning(f"Output reached {max_tokens} tokens, retrying with {settings.bedrock_max_output_tokens}")
+                normalized_text = self.invoke_bedrock(prompt, settings.bedrock_max_output_tokens)
             
-            logger.info("Invoking Bedrock Nova LLM")
-            response = bedrock_runtime.invoke_model(
-                modelId=self.model_id,
-                contentType="application/json",
-                accept="application/json",
-                body=json.dumps(request_body)
-            )
-            
-            # Step 4: Parse response
-            response_body = json.loads(response['body'].read())
-            normalized_text = response_body.get('output', {}).get('message', {}).get('content', [{}])[0].get('text', '').strip()
-            
-            if not normalized_text:
-                raise ValueError("Empty response from Bedrock API")
-            
-            # Step 5: Restore numbers using the map
+            # Step 4: Restore numbers using the map
             final_text = self.restore_numbers_after_llm(normalized_text, placeholder_map)
             
             logger.info(f"Successfully normalized text. Original length: {len(text)}, Final length: {len(final_text)}")
             return final_text
             
-        except ClientError as e:
+        except (BotoCoreError, ClientError) as e:
             error_msg = f"Bedrock API error: {str(e)}"
             logger.error(error_msg)
-            raise Exception(error_msg)
+            raise BedrockError(error_msg)
+        # JSONDecodeError subclasses ValueError, so it must be caught first
+        except orjson.JSONDecodeError as e:
+            error_msg = f"JSON parsing error: {str(e)}"
+            logger.error(error_msg)
+            raise BedrockError(error_msg)
         except ValueError as e:
             error_msg = f"Validation error: {str(e)}"
             logger.error(error_msg)
-            raise Exception(error_msg)
-        except json.JSONDecodeError as e:
-            error_msg = f"JSON parsing error: {str(e)}"
-            logger.error(error_msg)
-            raise Exception(error_msg)
+            raise BedrockError(error_msg)
         except Exception as e:
             error_msg = f"Unexpected error in text normalization: {str(e)}"
             logger.error(error_msg)
-            raise Exception(error_msg)
+            raise BedrockError(error_msg)
+    
+    def normalize_or_error(self, text: str) -> Union[str, BedrockError]:
+        """Normalize text, returning the BedrockError instead of raising it"""
+        try:
+            return self.normalize_with_bedrock(text)
+        except BedrockError as e:
+            return e
+    
+    def normalize_parallel_with_bedrock(self, texts: List[str]) -> List[Union[str, BedrockError]]:
+        """Normalize texts with concurrent Bedrock calls, one result or error per text"""
+        max_workers = min(len(texts), settings.max_concurrent_requests)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(self.normalize_or_error, texts))
+    
+    def normalize_batch_with_bedrock(self, texts: List[str]) -> List[Union[str, BedrockError]]:
+        """Normalize several texts with a single Bedrock Nova LLM call, one result or error per text"""
+        if len(texts) <= 1:
+            return [self.normalize_or_error(text) for text in texts]
+        
+        # Only texts with words go to the LLM; the rest are returned unchanged
+        pending = [i for i, text in enumerate(texts) if LETTER_PATTERN.search(text)]
+        if len(pending) < len(texts):
+            results = list(texts)
+            for i, normalized_text in zip(pending, self.normalize_batch_with_bedrock([texts[i] for i in pending])):
+                results[i] = normalized_text
+            return results
+        
+        # Placeholders are numbered per text; each output is restored with its own map
+        extracted = [self.extract_numbers_before_llm(text) for text in texts]
+        placeholder_texts = [text_with_placeholders for text_with_placeholders, _ in extracted]
+        max_tokens = sum(estimate_max_tokens(text) for text in placeholder_texts)
+        if max_tokens > settings.bedrock_max_output_tokens:
+            # Too much output for one call; split the chunk rather than have Bedrock reject it.
+            # Each half handles its own failures, so one half's results survive the other's errors
+            middle = len(texts) // 2
+            return self.normalize_batch_with_bedrock(texts[:middle]) + self.normalize_batch_with_bedrock(texts[middle:])
+        
+        try:
+            logger.info(f"Processing batch of {len(texts)} texts")
+            prompt = self.create_batch_prompt(placeholder_texts)
+            outputs = self.parse_batch_output(self.invoke_bedrock(prompt, max_tokens), len(texts))
+        except OutputTruncatedError as e:
+            logger.warning(f"Batched response was truncated: {str(e)}")
+            outputs = None
+        except (BotoCoreError, ClientError, ValueError) as e:
+            logger.error(f"Batched Bedrock call failed: {str(e)}")
+            outputs = None
+        
+        if outputs is None:
+            # Only this chunk is retried per text; results from other chunks are kept
+            logger.warning(f"Normalizing {len(texts)} batch texts individually")
+            return self.normalize_parallel_with_bedrock(texts)
+        
+        return [
+            self.restore_numbers_after_llm(output, placeholder_map)
+            for output, (_, placeholder_map) in zip(outputs, extracted)
+        ]
+
+# Shared normalizer, created during cold start and reused by warm invocations
+normalizer = BedrockTextNormalizer()
+
+def warm_bedrock() -> None:
+    """Make a one-token Bedrock call so TLS and credential setup happen during init"""
+    try:
+        normalizer.invoke_bedrock("Hi", max_tokens=1)
+    except OutputTruncatedError:
+        # Expected: the single allowed token is used up
+        pass
+    except Exception as e:
+        logger.warning(f"Bedrock warm-up failed: {str(e)}")
+
+if settings.warm_bedrock:
+    warm_bedrock()
+
+# Optional cross-instance cache table with schema {pk: sha256(text), normalized_text, ttl}
+dynamodb = boto3.client('dynamodb', region_name=settings.aws_region) if settings.dynamodb_cache_table else None
+
+def get_shared_cache(key: str) -> Optional[str]:
+    """Look up a normalized text in the shared cache table, treating errors as a miss"""
+    try:
+        response = dynamodb.get_item(
+            TableName=settings.dynamodb_cache_table,
+            Key={'pk': {'S': key}}
+        )
+        item = response.get('Item')
+        return item['normalized_text']['S'] if item else None
+    except (BotoCoreError, ClientError) as e:
+        logger.warning(f"Cache read failed: {str(e)}")
+        return None
+
+def set_shared_cache(key: str, normalized_text: str) -> None:
+    """Store a normalized text in the shared cache table, ignoring failures"""
+    try:
+        dynamodb.put_item(
+            TableName=settings.dynamodb_cache_table,
+            Item={
+                'pk': {'S': key},
+                'normalized_text': {'S': normalized_text},
+                'ttl': {'N': str(int(time.time()) + settings.cache_ttl_seconds)}
+            }
+        )
+    except (BotoCoreError, ClientError) as e:
+        logger.warning(f"Cache write failed: {str(e)}")
+
+@lru_cache(maxsize=settings.normalization_cache_size)
+def normalize_text_cached(text: str) -> str:
+    """Normalize text, reusing results from this warm container or the shared cache"""
+    if dynamodb is None:
+        return normalizer.normalize_with_bedrock(text)
+    
+    key = hashlib.sha256(text.encode()).hexdigest()
+    normalized_text = get_shared_cache(key)
+    if normalized_text is None:
+        normalized_text = normalizer.normalize_with_bedrock(text)
+        set_shared_cache(key, normalized_text)
+    return normalized_text
+
+def normalize_comment_batch(comments: List[Dict[str, Any]], context) -> List[Dict[str, Any]]:
+    """Normalize a batch invocation's comments together, reporting failures in the results"""
+    start_time = time.time()
+    texts = [item.get('text') for item in comments]
+    
+    # Failed batched calls are retried per text inside the normalizer; only texts that still fail come back as errors
+    normalized_texts = iter(normalizer.normalize_batch_with_bedrock([text for text in texts if text]))
+    
+    processing_time = time.time() - start_time
+    
+    results = []
+    for item, text in zip(comments, texts):
+        if not text:
+            normalized_text, lambda_instance_id = "Error: Text is required", 'error'
+        else:
+            normalized_text, lambda_instance_id = next(normalized_texts), context.aws_request_id
+            if isinstance(normalized_text, BedrockError):
+                normalized_text, lambda_instance_id = f"Error: {str(normalized_text)}", 'error'
+        
+        results.append({
+            'comment_id': item.get('comment_id'),
+            'original_text': text,
+            'normalized_text': normalized_text,
+            'processing_time': processing_time,
+            'lambda_instance_id': lambda_instance_id
+        })
+    
+    return results
+
+# Optional Bedrock batch inference for bulk workloads that don't need an immediate response
+s3 = boto3.client('s3', region_name=settings.aws_region) if settings.batch_inference_bucket else None
+bedrock = boto3.client('bedrock', region_name=settings.aws_region) if settings.batch_inference_bucket else None
+
+def submit_batch_inference_job(comments: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Write comments to S3 as JSONL and start a Bedrock batch inference job over them"""
+    if s3 is None:
+        raise InvalidRequestError("Batch inference is not configured")
+    
+    job_name = f"text-normalization-{uuid.uuid4().hex}"
+    prefix = f"batch/{job_name}"
+    
+    records = []
+    record_meta = {}  # recordId -> comment_id and placeholder map, needed to restore the output
+    for index, item in enumerate(comments):
+        text = item.get('text')
+        if not text:
+            continue
+        
+        record_id = str(index)
+        text_with_placeholders, placeholder_map = normalizer.extract_numbers_before_llm(text)
+        model_input = normalizer.create_request_body(
+            normalizer.create_prompt(text_with_placeholders),
+            estimate_max_tokens(text_with_placeholders)
+        )
+        records.append(orjson.dumps({'recordId': record_id, 'modelInput': model_input}))
+        record_meta[record_id] = {'comment_id': item.get('comment_id'), 'placeholders': placeholder_map}
+    
+    # Bedrock fails jobs below its minimum record count only after they are queued, so reject them here
+    if len(records) < settings.batch_inference_min_records:
+        raise InvalidRequestError(
+            f"Batch inference needs at least {settings.batch_inference_min_records} comments with text, got {len(records)}"
+        )
+    
+    bucket = settings.batch_inference_bucket
+    s3.put_object(Bucket=bucket, Key=f"{prefix}/input.jsonl", Body=b"\n".join(records))
+    s3.put_object(Bucket=bucket, Key=f"{prefix}/records.json", Body=orjson.dumps(record_meta))
+    
+    response = bedrock.create_model_invocation_job(
+        jobName=job_name,
+        roleArn=settings.batch_inference_role_arn,
+        modelId=normalizer.model_id,
+        inputDataConfig={'s3InputDataConfig': {'s3Uri': f"s3://{bucket}/{prefix}/input.jsonl"}},
+        outputDataConfig={'s3OutputDataConfig': {'s3Uri': f"s3://{bucket}/{prefix}/output/"}}
+    )
+    logger.info(f"Submitted batch inference job {job_name} with {len(records)} records")
+    
+    return {'job_arn': response['jobArn'], 'record_count': len(records)}
+
+def process_batch_inference_output(bucket: str, key: str) -> str:
+    """Restore numbers in a finished batch job's output and write the normalized results beside it"""
+    # Bedrock writes output to {prefix}/output/{job_id}/input.jsonl.out
+    prefix = key.split('/output/')[0]
+    record_meta = orjson.loads(s3.get_object(Bucket=bucket, Key=f"{prefix}/records.json")['Body'].read())
+    
+    results = []
+    for line in s3.get_object(Bucket=bucket, Key=key)['Body'].iter_lines():
+        if not line:
+            continue
+        record = orjson.loads(line)
+        meta = record_meta.get(record['recordId'], {})
+        
+        if 'modelOutput' in record:
+            output_text = record['modelOutput']['output']['message']['content'][0]['text'].strip()
+            normalized_text = normalizer.restore_numbers_after_llm(output_text, meta.get('placeholders', {}))
+        else:
+            normalized_text = f"Error: {record.get('error', {}).get('errorMessage', 'No model output')}"
+        
+        results.append(orjson.dumps({'comment_id': meta.get('comment_id'), 'normalized_text': normalized_text}))
+    
+    results_key = f"{prefix}/results.jsonl"
+    s3.put_object(Bucket=bucket, Key=results_key, Body=b"\n".join(results))
+    logger.info(f"Wrote {len(results)} batch inference results to {results_key}")
+    
+    return results_key
 
 def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
     """Lambda function handler for text normalization"""
     start_time = time.time()
     
     try:
+        if 'Records' in event:
+            # S3 notification for a finished batch inference job
+            results_keys = []
+            for record in event['Records']:
+                key = unquote_plus(record['s3']['object']['key'])
+                # Bedrock also writes a manifest; only the JSONL output holds records
+                if key.endswith('.jsonl.out'):
+                    results_keys.append(process_batch_inference_output(record['s3']['bucket']['name'], key))
+            
+            return {
+                'statusCode': 200,
+                'body': orjson.dumps({'results_keys': results_keys}).decode()
+            }
+        
         # Parse input
         if 'body' in event:
             # API Gateway event
-            body = json.loads(event['body'])
+            body = orjson.loads(event['body'])
         else:
             # Direct Lambda invocation
             body = event
         
-        comment_id = body.get('comment_id')
-        text = body.get('text')
-        
-        if not text:
-            return {
-                'statusCode': 400,
-                'body': json.dumps({
-                    'error': 'Text is required'
-                })
+        if body.get('mode') == 'batch':
+            # Bulk request: hand off to Bedrock batch inference and return the job
+            response_body = submit_batch_inference_job(body.get('comments', []))
+        elif 'comments' in body:
+            # Batch invocation: one result per comment, failures reported inline
+            response_body = {
+                'results': normalize_comment_batch(body['comments'], context)
+            }
+        else:
+            comment_id = body.get('comment_id')
+            text = body.get('text')
+            
+            if not text:
+                return {
+                    'statusCode': 400,
+                    'body': orjson.dumps({
+                        'error': 'Text is required'
+                    }).decode()
+                }
+            
+            # Normalize text
+            normalized_text = normalize_text_cached(text)
+            
+            processing_time = time.time() - start_time
+            
+            # Prepare response
+            response_body = {
+                'comment_id': comment_id,
+                'original_text': text,
+                'normalized_text': normalized_text,
+                'processing_time': processing_time,
+                'lambda_instance_id': context.aws_request_id
             }
-        
-        # Initialize normalizer
-        normalizer = BedrockTextNormalizer()
-        
-        # Normalize text
-        normalized_text = normalizer.normalize_with_bedrock(text)
-        
-        processing_time = time.time() - start_time
-        
-        # Prepare response
-        response_body = {
-            'comment_id': comment_id,
-            'original_text': text,
-            'normalized_text': normalized_text,
-            'processing_time': processing_time,
-            'lambda_instance_id': context.aws_request_id
-        }
         
         return {
             'statusCode': 200,
@@ -231,9 +585,17 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
                 'Access-Control-Allow-Headers': 'Content-Type',
                 'Access-Control-Allow-Methods': 'POST, OPTIONS'
             },
-            'body': json.dumps(response_body)
+            'body': orjson.dumps(response_body).decode()
         }
         
+    except InvalidRequestError as e:
+        logger.warning(f"Invalid request: {str(e)}")
+        return {
+            'statusCode': 400,
+            'body': orjson.dumps({
+                'error': str(e)
+            }).decode()
+        }
     except Exception as e:
         logger.error(f"Lambda function error: {str(e)}")
         return {
@@ -242,7 +604,7 @@ def lambda_handler(event: Dict[str, Any], context) -> Dict[str, Any]:
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({
+            'body': orjson.dumps({
                 'error': f'Internal server error: {str(e)}'
-            })
+            }).decode()
         } 
\ No newline at end of file
@@ -0,0 +1,25 @@
+"""
+Shared pytest fixtures
+"""
+import pytest
+import orjson
+from lambda_function import BedrockTextNormalizer
+
+
+@pytest.fixture(scope="session")
+def normalizer():
+    """Normalizer shared across the test session; it holds no per-test state"""
+    return BedrockTextNormalizer()
+
+
+@pytest.fixture(scope="session")
+def bedrock_ok_bytes():
+    """Bedrock response body, encoded once per session"""
+    return orjson.dumps({
+        'output': {
+            'message': {
+                'content': [{'text': 'The loan-to-value ratio is high. We need to bring it down to 80.5%.'}]
+            }
+        },
+        'stopReason': 'end_turn'
+    })
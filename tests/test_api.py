@@ -2,31 +2,114 @@
 Integration tests for FastAPI server endpoints
 """
 import pytest
-import json
+import pytest_asyncio
+import asyncio
+import aioboto3
+import httpx
+import logging
+import orjson
+from botocore.stub import Stubber
+from dataclasses import dataclass
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
-from unittest.mock import Mock, patch
-from api_server_gateway import app, invoke_lambda_function
+from logging.handlers import QueueHandler
+from unittest.mock import AsyncMock, MagicMock, Mock
+from api_server_gateway import (
+    app,
+    LAMBDA_FUNCTION_NAME,
+    invoke_lambda_function,
+    normalize_batch_comments,
+    normalize_comment,
+    BatchRequest,
+    CommentRequest,
+    CommentResponse,
+)
+
+
+@dataclass
+class FakePayload:
+    """Stand-in for the aiobotocore streaming Payload returned by Lambda invoke"""
+    data: bytes
+    
+    async def read(self) -> bytes:
+        return self.data
+
+
+def fake_lambda_response(status, payload):
+    """Build a Lambda invoke response with a readable Payload"""
+    return {'StatusCode': status, 'Payload': FakePayload(payload)}
+
+
+# Lambda payloads serialized once at import and shared by the integration tests
+LAMBDA_OK = {
+    'comment_id': 1,
+    'original_text': 'Test text',
+    'normalized_text': 'Normalized text',
+    'processing_time': 1.0,
+    'lambda_instance_id': 'lambda-123'
+}
+LAMBDA_OK_BYTES = orjson.dumps(LAMBDA_OK)
+LAMBDA_OK_API_GATEWAY_BYTES = orjson.dumps({'body': LAMBDA_OK_BYTES.decode()})
+LAMBDA_ERROR_BYTES = orjson.dumps({'error': 'Lambda execution failed'})
+
+
+def normalized_response(comment):
+    """Lambda result for a comment, keyed on its comment_id so call order doesn't matter"""
+    return CommentResponse(
+        comment_id=comment.comment_id,
+        original_text=comment.text,
+        normalized_text=f'Normalized {comment.text}',
+        processing_time=1.0,
+        lambda_instance_id=f'lambda-{comment.comment_id}'
+    )
+
+
+def expected_invoke_params(comment):
+    """Parameters the gateway sends to Lambda invoke for a comment"""
+    return {
+        'FunctionName': LAMBDA_FUNCTION_NAME,
+        'InvocationType': 'RequestResponse',
+        'Payload': orjson.dumps({'comment_id': comment.comment_id, 'text': comment.text})
+    }
+
+
+@pytest_asyncio.fixture
+async def lambda_stubber(mocker):
+    """Stubbed aioboto3 Lambda client installed as the app's client; no request leaves the process"""
+    session = aioboto3.Session(
+        aws_access_key_id='testing',
+        aws_secret_access_key='testing',
+        region_name='us-east-1'
+    )
+    async with session.client('lambda') as lambda_client:
+        mocker.patch.object(app.state, 'lambda_client', lambda_client, create=True)
+        with Stubber(lambda_client) as stubber:
+            yield stubber
+            stubber.assert_no_pending_responses()
+
+
+@pytest.fixture(scope="module")
+def client():
+    """Test client shared across the module so app startup runs once"""
+    with TestClient(app) as test_client:
+        yield test_client
 
 
 class TestAPIEndpoints:
     """Test cases for API endpoints"""
     
-    def setup_method(self):
-        """Setup method for each test"""
-        self.client = TestClient(app)
-    
-    def test_health_check(self):
+    def test_health_check(self, client):
         """Test health check endpoint"""
-        response = self.client.get("/health")
+        response = client.get("/health")
         
         assert response.status_code == 200
         data = response.json()
         assert data["status"] == "healthy"
         assert "timestamp" in data
     
-    def test_root_endpoint(self):
+    def test_root_endpoint(self, client):
         """Test root endpoint"""
-        response = self.client.get("/")
+        response = client.get("/")
         
         assert response.status_code == 200
         data = response.json()
@@ -34,80 +117,103 @@ class TestAPIEndpoints:
         assert data["version"] == "1.0.0"
         assert "endpoints" in data
     
-    @patch('api_server_gateway.invoke_lambda_function')
-    def test_normalize_single_comment_success(self, mock_invoke):
-        """Test successful single comment normalization"""
-        # Mock Lambda response
-        mock_invoke.return_value = {
-            'comment_id': 1,
-            'original_text': 'Loan-to-value high. Need bring down to 80.5%.',
-            'normalized_text': 'The loan-to-value ratio is high. We need to bring it down to 80.5%.',
-            'processing_time': 1.234,
-            'lambda_instance_id': 'lambda-123'
-        }
+    def test_queue_logging_attached_only_during_lifespan(self):
+        """Test the queue handler is attached with its listener and removed on shutdown"""
+        root_logger = logging.getLogger()
         
-        payload = {
-            'comment_id': 1,
-            'text': 'Loan-to-value high. Need bring down to 80.5%.'
-        }
+        def queue_handlers():
+            return [h for h in root_logger.handlers if isinstance(h, QueueHandler)]
         
-        response = self.client.post("/normalize", json=payload)
+        before = len(queue_handlers())
         
-        assert response.status_code == 200
-        data = response.json()
-        assert data['comment_id'] == 1
-        assert data['original_text'] == 'Loan-to-value high. Need bring down to 80.5%.'
-        assert data['normalized_text'] == 'The loan-to-value ratio is high. We need to bring it down to 80.5%.'
-        assert data['processing_time'] > 0
-        assert data['lambda_instance_id'] == 'lambda-123'
+        with TestClient(app):
+            assert len(queue_handlers()) == before + 1
+        
+        assert len(queue_handlers()) == before
+    
+    def test_redis_client_uses_short_timeouts(self, mocker):
+        """Test the response cache gives up quickly on an unresponsive Redis host"""
+        mocker.patch('api_server_gateway.settings.redis_url', 'redis://cache.internal:6379')
+        mocker.patch.object(app.state, 'redis', None)
+        mock_from_url = mocker.patch('api_server_gateway.redis.Redis.from_url')
+        mock_from_url.return_value.aclose = AsyncMock()
+        
+        with TestClient(app):
+            pass
+        
+        kwargs = mock_from_url.call_args.kwargs
+        assert kwargs['socket_timeout'] == kwargs['socket_connect_timeout'] == 0.25
     
-    @patch('api_server_gateway.invoke_lambda_function')
-    def test_normalize_single_comment_lambda_error(self, mock_invoke):
+    @pytest.mark.asyncio
+    async def test_normalize_single_comment_success(self, mocker):
+        """Test successful single comment normalization"""
+        mock_invoke = mocker.patch('api_server_gateway.invoke_lambda_function')
+        # Mock Lambda response
+        mock_invoke.return_value = CommentResponse(
+            comment_id=1,
+            original_text='Loan-to-value high. Need bring down to 80.5%.',
+            normalized_text='The loan-to-value ratio is high. We need to bring it down to 80.5%.',
+            processing_time=1.234,
+            lambda_instance_id='lambda-123'
+        )
+        
+        comment = CommentRequest(comment_id=1, text='Loan-to-value high. Need bring down to 80.5%.')
+        
+        result = await normalize_comment(comment)
+        
+        assert result.comment_id == 1
+        assert result.original_text == 'Loan-to-value high. Need bring down to 80.5%.'
+        assert result.normalized_text == 'The loan-to-value ratio is high. We need to bring it down to 80.5%.'
+        assert result.processing_time > 0
+        assert result.lambda_instance_id == 'lambda-123'
+    
+    @pytest.mark.asyncio
+    async def test_normalize_single_comment_lambda_error(self, mocker):
         """Test single comment normalization with Lambda error"""
+        mock_invoke = mocker.patch('api_server_gateway.invoke_lambda_function')
         mock_invoke.side_effect = Exception("Lambda invocation failed")
         
-        payload = {
-            'comment_id': 1,
-            'text': 'Test text'
-        }
+        with pytest.raises(HTTPException) as exc_info:
+            await normalize_comment(CommentRequest(comment_id=1, text='Test text'))
         
-        response = self.client.post("/normalize", json=payload)
+        assert exc_info.value.status_code == 500
+        assert "error" in exc_info.value.detail
+    
+    @pytest.mark.asyncio
+    async def test_normalize_single_comment_cache_hit(self, mocker):
+        """Test cached results are served without invoking Lambda"""
+        mock_invoke = mocker.patch('api_server_gateway.invoke_lambda_function')
+        mock_redis = Mock()
+        mock_redis.get = AsyncMock(return_value=orjson.dumps({
+            'comment_id': 7,
+            'original_text': 'Test text',
+            'normalized_text': 'Normalized text',
+            'processing_time': 1.0,
+            'lambda_instance_id': 'lambda-123'
+        }))
         
-        assert response.status_code == 500
-        data = response.json()
-        assert "error" in data["detail"]
+        mocker.patch.object(app.state, 'redis', mock_redis)
+        result = await normalize_comment(CommentRequest(comment_id=1, text='Test text'))
+        
+        assert result.comment_id == 1
+        assert result.normalized_text == 'Normalized text'
+        mock_invoke.assert_not_called()
     
-    def test_normalize_single_comment_invalid_payload(self):
+    def test_normalize_single_comment_invalid_payload(self, client):
         """Test single comment normalization with invalid payload"""
         payload = {
             'comment_id': 1
             # Missing 'text' field
         }
         
-        response = self.client.post("/normalize", json=payload)
+        response = client.post("/normalize", json=payload)
         
         assert response.status_code == 422  # Validation error
     
-    @patch('api_server_gateway.invoke_lambda_function')
-    def test_normalize_batch_comments_success(self, mock_invoke):
+    def test_normalize_batch_comments_success(self, client, mocker):
         """Test successful batch comment normalization"""
-        # Mock Lambda responses
-        mock_invoke.side_effect = [
-            {
-                'comment_id': 1,
-                'original_text': 'Comment 1',
-                'normalized_text': 'Normalized Comment 1',
-                'processing_time': 1.0,
-                'lambda_instance_id': 'lambda-1'
-            },
-            {
-                'comment_id': 2,
-                'original_text': 'Comment 2',
-                'normalized_text': 'Normalized Comment 2',
-                'processing_time': 1.5,
-                'lambda_instance_id': 'lambda-2'
-            }
-        ]
+        mock_invoke = mocker.patch('api_server_gateway.invoke_lambda_function')
+        mock_invoke.side_effect = normalized_response
         
         payload = {
             'comments': [
@@ -116,178 +222,288 @@ class TestAPIEndpoints:
             ]
         }
         
-        response = self.client.post("/normalize-batch", json=payload)
+        response = client.post("/normalize-batch", json=payload)
         
         assert response.status_code == 200
         data = response.json()
         assert len(data['results']) == 2
-        assert data['results'][0]['comment_id'] == 1
-        assert data['results'][1]['comment_id'] == 2
+        assert {r['comment_id'] for r in data['results']} == {1, 2}
+        assert {r['normalized_text'] for r in data['results']} == {'Normalized Comment 1', 'Normalized Comment 2'}
     
-    @patch('api_server_gateway.invoke_lambda_function')
-    def test_normalize_batch_comments_partial_failure(self, mock_invoke):
+    @pytest.mark.asyncio
+    async def test_normalize_batch_comments_partial_failure(self, mocker):
         """Test batch comment normalization with partial failures"""
-        # Mock Lambda responses - one success, one failure
-        mock_invoke.side_effect = [
-            {
-                'comment_id': 1,
-                'original_text': 'Comment 1',
-                'normalized_text': 'Normalized Comment 1',
-                'processing_time': 1.0,
-                'lambda_instance_id': 'lambda-1'
-            },
-            Exception("Lambda error for comment 2")
-        ]
+        mock_invoke = mocker.patch('api_server_gateway.invoke_lambda_function')
+        # Mock Lambda responses - comment 2 fails regardless of call order
+        def invoke(comment):
+            if comment.comment_id == 2:
+                raise Exception("Lambda error for comment 2")
+            return normalized_response(comment)
+        mock_invoke.side_effect = invoke
         
-        payload = {
-            'comments': [
-                {'comment_id': 1, 'text': 'Comment 1'},
-                {'comment_id': 2, 'text': 'Comment 2'}
-            ]
-        }
+        batch_request = BatchRequest(comments=[
+            {'comment_id': 1, 'text': 'Comment 1'},
+            {'comment_id': 2, 'text': 'Comment 2'}
+        ])
         
-        response = self.client.post("/normalize-batch", json=payload)
+        response = await normalize_batch_comments(batch_request)
         
-        assert response.status_code == 200
-        data = response.json()
-        assert len(data['results']) == 2
+        assert len(response.results) == 2
+        results = {r.comment_id: r for r in response.results}
         
         # Check successful result
-        assert data['results'][0]['comment_id'] == 1
-        assert data['results'][0]['normalized_text'] == 'Normalized Comment 1'
+        assert results[1].normalized_text == 'Normalized Comment 1'
         
         # Check failed result
-        assert data['results'][1]['comment_id'] == 2
-        assert 'Error:' in data['results'][1]['normalized_text']
+        assert 'Error:' in results[2].normalized_text
+    
+    @pytest.mark.asyncio
+    async def test_normalize_batch_comments_chunked(self, mocker):
+        """Test batch comments are sent to Lambda in chunks"""
+        mock_invoke_batch = mocker.patch('api_server_gateway.invoke_lambda_batch')
+        mock_invoke_batch.side_effect = lambda chunk: [normalized_response(comment) for comment in chunk]
+        
+        batch_request = BatchRequest(comments=[
+            {'comment_id': i, 'text': f'Comment {i}'} for i in range(1, 6)
+        ])
+        
+        mocker.patch('api_server_gateway.LAMBDA_BATCH_SIZE', 2)
+        response = await normalize_batch_comments(batch_request)
+        
+        assert [r.comment_id for r in response.results] == [1, 2, 3, 4, 5]
+        assert mock_invoke_batch.await_count == 3
+    
+    @pytest.mark.asyncio
+    async def test_normalize_batch_comments_chunk_missing_results(self, mocker):
+        """Test comments missing from a chunk's Lambda response become error results"""
+        mock_invoke_batch = mocker.patch('api_server_gateway.invoke_lambda_batch')
+        mock_invoke_batch.side_effect = lambda chunk: [normalized_response(comment) for comment in chunk[1:]]
+        
+        batch_request = BatchRequest(comments=[
+            {'comment_id': i, 'text': f'Comment {i}'} for i in range(1, 4)
+        ])
+        
+        mocker.patch('api_server_gateway.LAMBDA_BATCH_SIZE', 3)
+        response = await normalize_batch_comments(batch_request)
+        
+        results = response.results
+        assert [r.comment_id for r in results] == [1, 2, 3]
+        assert results[0].normalized_text == 'Error: Lambda returned no result for comment 1'
+        assert results[0].lambda_instance_id == 'error'
+        assert [r.normalized_text for r in results[1:]] == ['Normalized Comment 2', 'Normalized Comment 3']
+    
+    def test_normalize_batch_comments_server_busy(self, client, mocker):
+        """Test batch requests are rejected when the gateway is saturated"""
+        payload = {
+            'comments': [
+                {'comment_id': 1, 'text': 'Comment 1'}
+            ]
+        }
+        
+        mocker.patch('api_server_gateway.batch_limiter', asyncio.Semaphore(0))
+        response = client.post("/normalize-batch", json=payload)
+        
+        assert response.status_code == 503
     
-    def test_normalize_batch_comments_empty_list(self):
+    def test_normalize_batch_comments_empty_list(self, client):
         """Test batch comment normalization with empty list"""
         payload = {
             'comments': []
         }
         
-        response = self.client.post("/normalize-batch", json=payload)
+        response = client.post("/normalize-batch", json=payload)
         
         assert response.status_code == 200
         data = response.json()
         assert len(data['results']) == 0
 
 
+@pytest.mark.slow
 class TestLambdaIntegration:
     """Test cases for Lambda function integration"""
     
-    @patch('api_server_gateway.lambda_client.invoke')
-    def test_invoke_lambda_function_success(self, mock_invoke):
+    @pytest.mark.asyncio
+    async def test_invoke_lambda_function_success(self, lambda_stubber):
         """Test successful Lambda function invocation"""
-        from api_server_gateway import CommentRequest
+        comment = CommentRequest(comment_id=1, text='Test text')
+        lambda_stubber.add_response('invoke', fake_lambda_response(200, LAMBDA_OK_BYTES), expected_invoke_params(comment))
         
-        # Mock Lambda response
-        mock_response = Mock()
-        mock_response['StatusCode'] = 200
-        mock_response['Payload'].read.return_value = json.dumps({
-            'comment_id': 1,
-            'original_text': 'Test text',
-            'normalized_text': 'Normalized text',
-            'processing_time': 1.0,
-            'lambda_instance_id': 'lambda-123'
-        })
-        mock_invoke.return_value = mock_response
+        result = await invoke_lambda_function(comment)
         
+        assert result.comment_id == 1
+        assert result.original_text == 'Test text'
+        assert result.normalized_text == 'Normalized text'
+    
+    @pytest.mark.asyncio
+    async def test_invoke_lambda_function_api_gateway_response(self, lambda_stubber):
+        """Test Lambda function invocation with API Gateway response format"""
         comment = CommentRequest(comment_id=1, text='Test text')
-        result = invoke_lambda_function(comment)
+        lambda_stubber.add_response('invoke', fake_lambda_response(200, LAMBDA_OK_API_GATEWAY_BYTES), expected_invoke_params(comment))
+        
+        result = await invoke_lambda_function(comment)
         
-        assert result['comment_id'] == 1
-        assert result['original_text'] == 'Test text'
-        assert result['normalized_text'] == 'Normalized text'
-        mock_invoke.assert_called_once()
+        assert result.comment_id == 1
+        assert result.original_text == 'Test text'
+        assert result.normalized_text == 'Normalized text'
     
-    @patch('api_server_gateway.lambda_client.invoke')
-    def test_invoke_lambda_function_api_gateway_response(self, mock_invoke):
-        """Test Lambda function invocation with API Gateway response format"""
-        from api_server_gateway import CommentRequest
-        
-        # Mock API Gateway response format
-        mock_response = Mock()
-        mock_response['StatusCode'] = 200
-        mock_response['Payload'].read.return_value = json.dumps({
-            'body': json.dumps({
-                'comment_id': 1,
-                'original_text': 'Test text',
-                'normalized_text': 'Normalized text',
-                'processing_time': 1.0,
-                'lambda_instance_id': 'lambda-123'
-            })
-        })
-        mock_invoke.return_value = mock_response
+    @pytest.mark.asyncio
+    async def test_invoke_lambda_function_via_api_gateway_url(self, mocker):
+        """Test Lambda invocation through the configured API Gateway URL"""
+        # Mock API Gateway HTTP response
+        mock_http_response = Mock(status=200)
+        mock_http_response.read = AsyncMock(return_value=LAMBDA_OK_BYTES)
+        mock_session = MagicMock()
+        mock_session.post.return_value.__aenter__.return_value = mock_http_response
         
         comment = CommentRequest(comment_id=1, text='Test text')
-        result = invoke_lambda_function(comment)
-        
-        assert result['comment_id'] == 1
-        assert result['original_text'] == 'Test text'
-        assert result['normalized_text'] == 'Normalized text'
+        mocker.patch.object(app.state, 'http_session', mock_session)
+        mocker.patch('api_server_gateway.NORMALIZE_URL', 'https://example.com/prod/normalize')
+        result = await invoke_lambda_function(comment)
+        
+        assert result.normalized_text == 'Normalized text'
+        mock_session.post.assert_called_once_with(
+            'https://example.com/prod/normalize',
+            json={'comment_id': 1, 'text': 'Test text'}
+        )
     
-    @patch('api_server_gateway.lambda_client.invoke')
-    def test_invoke_lambda_function_failure(self, mock_invoke):
+    @pytest.mark.asyncio
+    async def test_invoke_lambda_function_failure(self, lambda_stubber):
         """Test Lambda function invocation failure"""
-        from api_server_gateway import CommentRequest
-        from fastapi import HTTPException
+        comment = CommentRequest(comment_id=1, text='Test text')
+        lambda_stubber.add_response('invoke', fake_lambda_response(500, LAMBDA_ERROR_BYTES), expected_invoke_params(comment))
         
-        # Mock Lambda failure
-        mock_response = Mock()
-        mock_response['StatusCode'] = 500
-        mock_response['Payload'].read.return_value = json.dumps({
-            'error': 'Lambda execution failed'
-        })
-        mock_invoke.return_value = mock_response
+        with pytest.raises(HTTPException) as exc_info:
+            await invoke_lambda_function(comment)
         
+        assert exc_info.value.status_code == 500
+    
+    @pytest.mark.asyncio
+    async def test_invoke_lambda_function_malformed_json(self, lambda_stubber):
+        """Test a non-JSON Lambda payload is a server error, not a client validation error"""
         comment = CommentRequest(comment_id=1, text='Test text')
+        lambda_stubber.add_response('invoke', fake_lambda_response(200, b'not json'), expected_invoke_params(comment))
         
         with pytest.raises(HTTPException) as exc_info:
-            invoke_lambda_function(comment)
+            await invoke_lambda_function(comment)
         
         assert exc_info.value.status_code == 500
-        assert "Lambda invocation failed" in str(exc_info.value.detail)
+        assert exc_info.value.detail.startswith("JSON parsing error")
 
 
+@pytest.mark.slow
 class TestConcurrency:
     """Test cases for concurrent processing"""
     
-    @patch('api_server_gateway.invoke_lambda_function')
-    def test_concurrent_lambda_invocations(self, mock_invoke):
-        """Test concurrent Lambda invocations"""
-        from api_server_gateway import invoke_lambda_concurrent
-        
-        # Mock Lambda responses
-        mock_invoke.side_effect = [
-            {
-                'comment_id': 1,
-                'original_text': 'Comment 1',
-                'normalized_text': 'Normalized 1',
-                'processing_time': 1.0,
-                'lambda_instance_id': 'lambda-1'
-            },
-            {
-                'comment_id': 2,
-                'original_text': 'Comment 2',
-                'normalized_text': 'Normalized 2',
-                'processing_time': 1.5,
-                'lambda_instance_id': 'lambda-2'
-            }
+    @pytest.mark.asyncio
+    async def test_concurrent_lambda_invocations(self, mocker):
+        """Test batch invocations overlap and results keep request order"""
+        mock_invoke = mocker.patch('api_server_gateway.invoke_lambda_function')
+        in_flight = 0
+        max_in_flight = 0
+        
+        async def slow_invoke(comment):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            # Later comments finish first, so ordering must come from the gateway
+            await asyncio.sleep(0.01 * (9 - comment.comment_id))
+            in_flight -= 1
+            return CommentResponse(
+                comment_id=comment.comment_id,
+                original_text=comment.text,
+                normalized_text=f'Normalized {comment.comment_id}',
+                processing_time=1.0,
+                lambda_instance_id=f'lambda-{comment.comment_id}'
+            )
+        mock_invoke.side_effect = slow_invoke
+        
+        batch_request = BatchRequest(comments=[
+            {'comment_id': i, 'text': f'Comment {i}'} for i in range(1, 9)
+        ])
+        
+        response = await normalize_batch_comments(batch_request)
+        
+        assert mock_invoke.await_count == 8
+        assert max_in_flight > 1
+        assert [r.comment_id for r in response.results] == list(range(1, 9))
+        assert [r.normalized_text for r in response.results] == [f'Normalized {i}' for i in range(1, 9)]
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_batches_share_invocation_limit(self, mocker):
+        """Test the in-flight invocation cap applies across concurrent batches, not per batch"""
+        mocker.patch('api_server_gateway.invoke_limiter', asyncio.Semaphore(3))
+        mock_invoke = mocker.patch('api_server_gateway.invoke_lambda_function')
+        in_flight = 0
+        max_in_flight = 0
+        
+        async def slow_invoke(comment):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return normalized_response(comment)
+        mock_invoke.side_effect = slow_invoke
+        
+        batches = [
+            BatchRequest(comments=[{'comment_id': i, 'text': f'Comment {i}'} for i in range(1, 5)])
+            for _ in range(3)
         ]
+        responses = await asyncio.gather(*(normalize_batch_comments(batch) for batch in batches))
         
-        from api_server_gateway import CommentRequest
-        results = [None, None]
-        
-        # Test concurrent execution
-        invoke_lambda_concurrent(CommentRequest(comment_id=1, text='Comment 1'), results, 0)
-        invoke_lambda_concurrent(CommentRequest(comment_id=2, text='Comment 2'), results, 1)
-        
-        assert results[0] is not None
-        assert results[1] is not None
-        assert results[0]['comment_id'] == 1
-        assert results[1]['comment_id'] == 2
-
+        assert all(len(response.results) == 4 for response in responses)
+        assert mock_invoke.await_count == 12
+        assert max_in_flight == 3
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_single_comment_requests(self, mocker):
+        """Test concurrent /normalize requests overlap through the ASGI app"""
+        mock_invoke = mocker.patch('api_server_gateway.invoke_lambda_function')
+        in_flight = 0
+        max_in_flight = 0
+        
+        async def slow_invoke(comment):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return normalized_response(comment)
+        mock_invoke.side_effect = slow_invoke
+        
+        payloads = [{'comment_id': i, 'text': f'Comment {i}'} for i in range(1, 33)]
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            responses = await asyncio.gather(*[async_client.post("/normalize", json=p) for p in payloads])
+        
+        assert all(r.status_code == 200 for r in responses)
+        assert [r.json()['comment_id'] for r in responses] == list(range(1, 33))
+        assert mock_invoke.await_count == 32
+        assert max_in_flight > 1
+    
+    @pytest.mark.asyncio
+    async def test_duplicate_requests_share_lambda_invocation(self, mocker):
+        """Test concurrent requests for the same text invoke Lambda once"""
+        mock_invoke = mocker.patch('api_server_gateway.invoke_lambda_function')
+        async def slow_invoke(comment):
+            await asyncio.sleep(0.01)
+            return CommentResponse(
+                comment_id=comment.comment_id,
+                original_text=comment.text,
+                normalized_text='Normalized text',
+                processing_time=1.0,
+                lambda_instance_id='lambda-1'
+            )
+        mock_invoke.side_effect = slow_invoke
+        
+        responses = await asyncio.gather(
+            normalize_comment(CommentRequest(comment_id=1, text='Same text')),
+            normalize_comment(CommentRequest(comment_id=2, text='Same text'))
+        )
+        
+        mock_invoke.assert_awaited_once()
+        assert [r.comment_id for r in responses] == [1, 2]
+        assert all(r.normalized_text == 'Normalized text' for r in responses)
 
 if __name__ == "__main__":
     pytest.main([__file__]) 
\ No newline at end of file